@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Request, Form, status, HTTPException
+from fastapi import APIRouter, Request, Form, File, UploadFile, status, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy import func
 
 from db.db import SessionLocal
 from db.models import Network, Account, Post
 from api.api_globals import templates
+from api.accounts_utl import (
+    BULK_ACTIONS, BULK_FILTERS, import_accounts, iter_import_urls, validate_import_file, bulk_account_action
+)
+from utl.logging import logger
+from utl.profiling import ProfiledRoute
 
-router = APIRouter(prefix="/networks/{network_id}/accounts")
+router = APIRouter(prefix="/networks/{network_id}/accounts", route_class=ProfiledRoute)
 
 @router.get("/", response_class=HTMLResponse)
 def show_accounts_for_network(request: Request, network_id: int):
@@ -61,6 +66,67 @@ def delete_account(network_id: int, account_id: int):
         account = db.query(Account).filter(Account.id == account_id, Account.network_id == network_id).first()
         if not account:
             raise HTTPException(status_code=404, detail="Account not found")
+        db.query(Post).filter(Post.account_id == account.id).delete(synchronize_session=False)
         db.delete(account)
         db.commit()
     return RedirectResponse(url=f"/networks/{network_id}/accounts", status_code=status.HTTP_303_SEE_OTHER)
+
+@router.post("/import")
+def import_accounts_file(network_id: int, file: UploadFile = File(...)):
+    with SessionLocal() as db:
+        network = db.query(Network).filter(Network.id == network_id).first()
+        if not network:
+            raise HTTPException(status_code=404, detail="Network not found")
+        filename = file.filename or ""
+        try:
+            validate_import_file(file.file, filename)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid import file: {e}")
+        added = import_accounts(db, network.id, iter_import_urls(file.file, filename))
+    logger.info(f"Imported {added} new accounts into network {network_id}")
+    return {"status": "ok", "added": added}
+
+@router.post("/bulk")
+def bulk_accounts(network_id: int, payload: dict):
+    action = payload.get("action")
+    if action not in BULK_ACTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown action, expected one of {', '.join(BULK_ACTIONS)}")
+
+    ids = payload.get("ids")
+    filters = payload.get("filter")
+    if ids is None and not filters:
+        raise HTTPException(status_code=400, detail="Either ids or filter is required")
+
+    if ids is not None and (
+        not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)
+    ):
+        raise HTTPException(status_code=400, detail="ids must be a list of integers")
+
+    if filters is not None:
+        if not isinstance(filters, dict):
+            raise HTTPException(status_code=400, detail="filter must be an object")
+        unknown = set(filters) - set(BULK_FILTERS)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown filter keys: {', '.join(sorted(unknown))}, expected {', '.join(BULK_FILTERS)}"
+            )
+        for key in ("blacklisted", "just_added"):
+            if key in filters and not isinstance(filters[key], bool):
+                raise HTTPException(status_code=400, detail=f"filter.{key} must be a boolean")
+        if "score_below" in filters and (
+            not isinstance(filters["score_below"], (int, float)) or isinstance(filters["score_below"], bool)
+        ):
+            raise HTTPException(status_code=400, detail="filter.score_below must be a number")
+
+    target_network_id = payload.get("target_network_id")
+    if action == "move" and (not isinstance(target_network_id, int) or isinstance(target_network_id, bool)):
+        raise HTTPException(status_code=400, detail="target_network_id must be an integer for move")
+
+    with SessionLocal() as db:
+        if action == "move" and not db.query(Network).filter(Network.id == target_network_id).first():
+            raise HTTPException(status_code=404, detail="Target network not found")
+
+        affected = bulk_account_action(db, network_id, action, ids, filters, target_network_id)
+    logger.info(f"Bulk {action} applied to {affected} accounts in network {network_id}")
+    return {"status": "ok", "action": action, "affected": affected}
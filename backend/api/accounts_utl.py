@@ -1,3 +1,8 @@
+import csv
+import io
+import json
+
+from sqlalchemy import text, update, delete
 from sqlalchemy.orm import Session
 
 from utl.logging import logger
@@ -5,6 +10,124 @@ from db.db import SessionLocal
 from db.models import Network, Account, Post
 from api.api_globals import client
 
+BULK_ACTIONS = ("delete", "blacklist", "unblacklist", "move")
+BULK_FILTERS = ("blacklisted", "just_added", "score_below")
+
+
+# File-like wrapper that lets COPY pull rows from a generator
+class _CopyStream:
+    def __init__(self, rows):
+        self._rows = rows
+        self._buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._rows)
+            except StopIteration:
+                break
+        if size < 0:
+            chunk, self._buffer = self._buffer, ""
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def _copy_rows(urls):
+    for url in urls:
+        url = url.strip()
+        if not url:
+            continue
+        # COPY text format: backslash is the escape char, tab/newline separate values
+        url = url.replace("\\", "\\\\").replace("\t", " ").replace("\r", "").replace("\n", "")
+        yield url + "\n"
+
+
+def iter_import_urls(fileobj, filename: str):
+    stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        if filename.lower().endswith((".ndjson", ".jsonl")):
+            for line_no, line in enumerate(stream, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                url = record.get("url") if isinstance(record, dict) else record
+                if not isinstance(url, str):
+                    raise ValueError(f"line {line_no}: expected a url string")
+                yield url
+        else:
+            try:
+                for row in csv.reader(stream):
+                    if not row or row[0].strip().lower() == "url":
+                        continue
+                    yield row[0]
+            except csv.Error as e:
+                raise ValueError(str(e))
+    finally:
+        # Leave the upload open so it can be read again
+        stream.detach()
+
+
+def validate_import_file(fileobj, filename: str) -> int:
+    # COPY swallows exceptions raised while it reads the stream, so bad input
+    # is caught in a separate pass before anything is sent to the database
+    count = sum(1 for _ in iter_import_urls(fileobj, filename))
+    fileobj.seek(0)
+    return count
+
+
+def import_accounts(db: Session, network_id: int, urls) -> int:
+    db.execute(text("CREATE TEMP TABLE account_import (url TEXT) ON COMMIT DROP"))
+
+    cursor = db.connection().connection.cursor()
+    cursor.copy_expert("COPY account_import (url) FROM STDIN", _CopyStream(_copy_rows(urls)))
+
+    added = db.execute(text("""
+        INSERT INTO accounts (url, network_id, just_added, blacklisted)
+        SELECT DISTINCT url, :network_id, true, false FROM account_import
+        ON CONFLICT (url) DO NOTHING
+    """), {"network_id": network_id}).rowcount
+    db.commit()
+    return added
+
+
+def bulk_account_action(db: Session, network_id: int, action: str, ids=None, filters=None, target_network_id=None) -> int:
+    selection = db.query(Account.id).filter(Account.network_id == network_id)
+    if ids is not None:
+        selection = selection.filter(Account.id.in_(ids))
+    filters = filters or {}
+    if "blacklisted" in filters:
+        selection = selection.filter(Account.blacklisted == bool(filters["blacklisted"]))
+    if "just_added" in filters:
+        selection = selection.filter(Account.just_added == bool(filters["just_added"]))
+    if "score_below" in filters:
+        selection = selection.filter(Account.score < float(filters["score_below"]))
+    selected = selection.scalar_subquery()
+    no_sync = {"synchronize_session": False}
+
+    if action == "delete":
+        db.execute(delete(Post).where(Post.account_id.in_(selected)), execution_options=no_sync)
+        affected = db.execute(delete(Account).where(Account.id.in_(selected)), execution_options=no_sync).rowcount
+    elif action in ("blacklist", "unblacklist"):
+        affected = db.execute(
+            update(Account).where(Account.id.in_(selected)).values(blacklisted=action == "blacklist"),
+            execution_options=no_sync,
+        ).rowcount
+    else:
+        # Posts first: the selection is scoped to the source network
+        db.execute(
+            update(Post).where(Post.account_id.in_(selected)).values(network_id=target_network_id),
+            execution_options=no_sync,
+        )
+        affected = db.execute(
+            update(Account).where(Account.id.in_(selected)).values(network_id=target_network_id),
+            execution_options=no_sync,
+        ).rowcount
+
+    db.commit()
+    return affected
+
 def sync_accounts_from_google_sheets():
     logger.info("Starting sync with Google Sheets")
 
@@ -33,20 +156,8 @@ def sync_accounts_from_google_sheets():
                 logger.warning(f"Sheet not found for network {network.name}: {e}")
                 continue
 
-            for url in rows:
-                url = url.strip()
-                if not url:
-                    continue
-
-                exists = db.query(Account).filter(Account.url == url).first()
-                if not exists:
-                    db.add(Account(
-                        url=url,
-                        network_id=network.id,
-                        just_added=True
-                    ))
+            import_accounts(db, network.id, rows)
 
-        db.commit()
     logger.info("Finished sync with Google Sheets")
 
 def calculate_scores_and_blacklist(db: Session, network_id: int, blacklist_percentage: float):
@@ -9,8 +9,9 @@ from db.models import Network, Account, Post
 from utl.logging import logger
 from api.api_globals import templates, LOGOS
 from api.networks_utl import get_or_create_other
+from utl.profiling import ProfiledRoute
 
-router = APIRouter(prefix="/networks")
+router = APIRouter(prefix="/networks", route_class=ProfiledRoute)
 
 @router.get("/", response_class=HTMLResponse)
 def show_networks(request: Request):
@@ -1,14 +1,77 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import RedirectResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
 import asyncio
 import json
+import os
 
-from db.models import Network, Account
+from db.models import Network, Account, Post
 from db.db import get_db
 from utl.logging import logger
+from utl.profiling import ProfiledRoute, track_subprocess
+
+router = APIRouter(prefix="/parser", route_class=ProfiledRoute)
+
+# Profile pages show the latest posts first, older known posts never come up
+KNOWN_POSTS_LIMIT = 30
+# Posts outside this window are discarded by the parsers anyway
+POST_WINDOW = timedelta(days=7)
+# Metrics barely move once a post is this old
+SETTLE_AGE = timedelta(hours=48)
+RESCRAPE_INTERVAL = timedelta(hours=6)
+
+
+def is_settled(published_at, scraped_at, now) -> bool:
+    if published_at is None:
+        return False
+    # Out-of-window posts are discarded anyway, whether or not they were ever rescraped
+    if published_at < now - POST_WINDOW:
+        return True
+    if scraped_at is None:
+        return False
+    if scraped_at >= published_at + SETTLE_AGE:
+        return True
+    return scraped_at > now - RESCRAPE_INTERVAL
+
+
+def build_accounts_batch(db: Session, accounts: list) -> list:
+    now = datetime.utcnow()
+    acc_ids = [acc.id for acc in accounts]
+
+    rn = func.row_number().over(
+        partition_by=Post.account_id,
+        order_by=Post.published_at.desc().nullslast(),
+    ).label("rn")
+    recent = (
+        db.query(Post.account_id, Post.url, Post.published_at, Post.scraped_at,
+                 Post.views, Post.likes, Post.comments, rn)
+          .filter(Post.account_id.in_(acc_ids), Post.url_hash.isnot(None))
+          .subquery()
+    )
+
+    known_posts = {}
+    for post in db.query(recent).filter(recent.c.rn <= KNOWN_POSTS_LIMIT):
+        known_posts.setdefault(post.account_id, []).append({
+            "url": post.url,
+            # Stored as naive UTC, the Z keeps JS from reading it as local time
+            "published_at": post.published_at.isoformat() + "Z" if post.published_at else None,
+            "scraped_at": post.scraped_at.isoformat() + "Z" if post.scraped_at else None,
+            "views": post.views,
+            "likes": post.likes,
+            "comments": post.comments,
+            "settled": is_settled(post.published_at, post.scraped_at, now),
+        })
+
+    return [{
+        "id": acc.id,
+        "url": acc.url,
+        "network_id": acc.network_id,
+        "followers": acc.followers,
+        "known_posts": known_posts.get(acc.id, []),
+    } for acc in accounts]
 
-router = APIRouter(prefix="/parser")
 
 async def run_parser_script(network_name: str, accounts_data: list):
     script_map = {
@@ -28,10 +91,12 @@ async def run_parser_script(network_name: str, accounts_data: list):
             "node", script_path,
             stdin=asyncio.subprocess.PIPE,
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+            stderr=asyncio.subprocess.PIPE,
+            env={**os.environ, "PARSER_BATCH_STDIN": "true"}
         )
         
-        stdout, stderr = await proc.communicate(input=accounts_json.encode())
+        async with track_subprocess(f"node {script_path}"):
+            stdout, stderr = await proc.communicate(input=accounts_json.encode())
         
         if proc.returncode != 0:
             logger.error(f"{network_name} parser failed: {stderr.decode()}")
@@ -45,6 +110,13 @@ async def run_parser_script(network_name: str, accounts_data: list):
         return {"status": "error", "details": str(e)}
 
 
+# Each parser handles a single network, so the batch is always scoped to one
+@router.get("/accounts-for-parsing/")
+def accounts_for_parsing(network_id: int, db: Session = Depends(get_db)):
+    accounts = db.query(Account).filter(Account.network_id == network_id).all()
+    return build_accounts_batch(db, accounts)
+
+
 @router.post("/sync_posts/{network_id}")
 async def sync_posts_for_network(network_id: int, db: Session = Depends(get_db)):
     try:
@@ -55,10 +127,7 @@ async def sync_posts_for_network(network_id: int, db: Session = Depends(get_db))
         accounts = db.query(Account).filter(Account.network_id == network_id).all()
         
         if accounts:
-            accounts_data = [{
-                "id": acc.id,
-                "url": acc.url,
-            } for acc in accounts]
+            accounts_data = build_accounts_batch(db, accounts)
             
             logger.info(f"Manual sync started for {len(accounts_data)} {network.name} accounts")
             result = await run_parser_script(network.name, accounts_data)
@@ -85,10 +154,7 @@ async def parse_all_accounts(db: Session = Depends(get_db)):
             if not accounts:
                 continue
                 
-            accounts_data = [{
-                "id": acc.id,
-                "url": acc.url,
-            } for acc in accounts]
+            accounts_data = build_accounts_batch(db, accounts)
             
             logger.info(f"Parsing {len(accounts_data)} {network.name} accounts")
             result = await run_parser_script(network.name, accounts_data)
@@ -119,10 +185,7 @@ async def parse_network(network_name: str, db: Session = Depends(get_db)):
                 "message": f"No accounts found for {network_name}"
             }
         
-        accounts_data = [{
-            "id": acc.id,
-            "url": acc.url,
-        } for acc in accounts]
+        accounts_data = build_accounts_batch(db, accounts)
         
         logger.info(f"Parsing {len(accounts_data)} {network_name} accounts")
         result = await run_parser_script(network_name, accounts_data)
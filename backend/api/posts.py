@@ -1,20 +1,83 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import REAL, cast, func, tuple_
 from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
 import asyncio
 from db.models import Network, Post
 from db.db import SessionLocal, get_db
 from utl.logging import logger
+from api.posts_utl import upsert_posts, apply_post_delta
+from utl.profiling import ProfiledRoute, track_subprocess
 
 
-router = APIRouter(prefix="/posts", tags=["Posts"])
+router = APIRouter(prefix="/posts", tags=["Posts"], route_class=ProfiledRoute)
 
 @router.post("/posts/save")
+@router.post("/bulk-create/")
 def save_posts(payload: dict, db: Session = Depends(get_db)):
-    for post in payload["posts"]:
-        if not db.query(Post).filter(Post.url == post["url"]).first():
-            db.add(Post(**post))
-    db.commit()
-    return {"status": "ok"}
+    network_id = payload.get("network_id")
+    posts = [{"network_id": network_id, **post} for post in payload["posts"]]
+    saved = upsert_posts(db, posts)
+    return {"status": "ok", "saved": saved}
+
+
+@router.post("/delta/")
+def save_post_delta(payload: dict, db: Session = Depends(get_db)):
+    result = apply_post_delta(db, payload)
+    return {"status": "ok", **result}
+
+
+@router.get("/search")
+def search_posts(
+    q: str = Query(..., min_length=1),
+    network_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    after_rank: Optional[float] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    if (after_rank is None) != (after_id is None):
+        raise HTTPException(status_code=400, detail="after_rank and after_id must be given together")
+
+    ts_query = func.websearch_to_tsquery("simple", q)
+    rank = func.ts_rank_cd(Post.description_tsv, ts_query)
+
+    query = db.query(Post, rank.label("rank")).filter(Post.description_tsv.op("@@")(ts_query))
+    if network_id is not None:
+        query = query.filter(Post.network_id == network_id)
+    if date_from is not None:
+        query = query.filter(Post.published_at >= date_from)
+    if date_to is not None:
+        query = query.filter(Post.published_at < date_to)
+    if after_rank is not None:
+        # ts_rank_cd returns real; compare as real so the cursor matches exactly
+        query = query.filter(tuple_(rank, Post.id) < tuple_(cast(after_rank, REAL), after_id))
+
+    rows = query.order_by(rank.desc(), Post.id.desc()).limit(limit).all()
+
+    results = [{
+        "id": post.id,
+        "account_id": post.account_id,
+        "network_id": post.network_id,
+        "url": post.url,
+        "published_at": post.published_at.isoformat() if post.published_at else None,
+        "views": post.views,
+        "likes": post.likes,
+        "comments": post.comments,
+        "score": post.score,
+        "description": post.description,
+        "rank": post_rank,
+    } for post, post_rank in rows]
+
+    next_cursor = None
+    if len(rows) == limit:
+        last_post, last_rank = rows[-1]
+        next_cursor = {"after_rank": last_rank, "after_id": last_post.id}
+
+    return {"results": results, "next": next_cursor}
 
 
 @router.post("/sync_posts/{network_id}")
@@ -43,7 +106,8 @@ async def sync_posts_for_network(network_id: int):
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE
     )
-    stdout, stderr = await proc.communicate()
+    async with track_subprocess(f"node {script_path}"):
+        stdout, stderr = await proc.communicate()
 
     if proc.returncode != 0:
         logger.error(f"{name} parser failed: {stderr.decode()}")
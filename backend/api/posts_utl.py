@@ -1,12 +1,188 @@
-import asyncio
+from datetime import datetime
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from db.db import SessionLocal
+from db.models import Network, Account, Post
+from api.parser import build_accounts_batch, run_parser_script
 from utl.logging import logger
+from utl.urls import canonicalize_post_url, post_url_hash
+
+POST_FIELDS = ("account_id", "network_id", "published_at", "views", "likes", "comments", "score", "description")
+METRIC_FIELDS = ("views", "likes", "comments", "score")
+
+BACKFILL_BATCH_SIZE = 5000
+
 
 async def parse_instagram_posts():
-    proc = await asyncio.create_subprocess_exec(
-            "node", "parser/instagram.js",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-            )
-    stdout, stderr = await proc.communicate()
-    if proc.returncode != 0:
-        logger.error(f"Parser failed: {stderr.decode()}")
+    with SessionLocal() as db:
+        network = db.query(Network).filter(Network.name == "instagram").first()
+        if not network:
+            logger.warning("Network instagram not found, nothing to parse")
+            return
+        network_name = network.name
+        accounts = db.query(Account).filter(Account.network_id == network.id).all()
+        accounts_data = build_accounts_batch(db, accounts)
+
+    if not accounts_data:
+        return
+
+    result = await run_parser_script(network_name, accounts_data)
+    if result["status"] == "error":
+        logger.error(f"Parser failed: {result.get('details')}")
+
+
+def upsert_posts(db: Session, posts: list) -> int:
+    scraped_at = datetime.utcnow()
+    sent = set()
+    rows = {}
+    for post in posts:
+        if not post.get("url"):
+            continue
+        url = canonicalize_post_url(post["url"])
+        sent.update(key for key in METRIC_FIELDS if key in post)
+        # A multi-row INSERT needs the same keys in every row
+        row = {key: post.get(key) for key in POST_FIELDS}
+        row["url"] = url
+        row["url_hash"] = post_url_hash(url)
+        row["scraped_at"] = scraped_at
+        # The same post can show up as /p/ and /reel/ in one batch: merge the rows
+        # so values one of them lacks are taken from the other
+        existing = rows.get(row["url_hash"])
+        if existing is None:
+            rows[row["url_hash"]] = row
+        else:
+            existing.update({key: value for key, value in row.items() if value is not None})
+
+    if not rows:
+        return 0
+
+    stmt = insert(Post).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Post.url_hash],
+        # Fields a row did not send come in as NULL and must not wipe stored values
+        set_={
+            **{key: func.coalesce(getattr(stmt.excluded, key), getattr(Post, key)) for key in sent},
+            "scraped_at": stmt.excluded.scraped_at,
+        },
+    )
+    db.execute(stmt)
+    db.commit()
+    return len(rows)
+
+
+def apply_post_delta(db: Session, delta: dict) -> dict:
+    network_id = delta.get("network_id")
+    account_id = delta.get("account_id")
+    scraped_at = datetime.utcnow()
+
+    new_posts = [{"network_id": network_id, "account_id": account_id, **post} for post in delta.get("new", [])]
+    added = upsert_posts(db, new_posts)
+
+    # Changed posts only carry the metrics that moved, the rest is kept as stored
+    changed = []
+    for post in delta.get("changed", []):
+        if not post.get("url"):
+            continue
+        row = {key: post.get(key) for key in METRIC_FIELDS}
+        row["url_hash"] = post_url_hash(canonicalize_post_url(post["url"]))
+        row["scraped_at"] = scraped_at
+        changed.append(row)
+    if changed:
+        db.execute(text("""
+            UPDATE posts SET
+                views = coalesce(:views, views), likes = coalesce(:likes, likes),
+                comments = coalesce(:comments, comments), score = coalesce(:score, score),
+                scraped_at = :scraped_at
+            WHERE url_hash = :url_hash
+        """), changed)
+
+    seen = [post_url_hash(canonicalize_post_url(url)) for url in delta.get("seen", []) if url]
+    if seen:
+        db.execute(
+            text("UPDATE posts SET scraped_at = :scraped_at WHERE url_hash = ANY(:hashes)"),
+            {"scraped_at": scraped_at, "hashes": seen},
+        )
+
+    db.commit()
+    return {"added": added, "changed": len(changed), "seen": len(seen)}
+
+
+def backfill_post_url_hashes():
+    with SessionLocal() as db:
+        # Rows without a URL have nothing to key on and stay out of the merge
+        pending = (
+            db.query(Post.id, Post.url)
+              .filter(Post.url_hash.is_(None), Post.url.isnot(None), func.btrim(Post.url) != "")
+              .yield_per(BACKFILL_BATCH_SIZE)
+        )
+
+        db.execute(text(
+            "CREATE TEMP TABLE post_url_backfill (id INTEGER PRIMARY KEY, url TEXT, url_hash BIGINT) ON COMMIT DROP"
+        ))
+
+        total = 0
+        batch = []
+        for post_id, url in pending:
+            canonical = canonicalize_post_url(url)
+            batch.append({"id": post_id, "url": canonical, "url_hash": post_url_hash(canonical)})
+            if len(batch) >= BACKFILL_BATCH_SIZE:
+                db.execute(text("INSERT INTO post_url_backfill VALUES (:id, :url, :url_hash)"), batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            db.execute(text("INSERT INTO post_url_backfill VALUES (:id, :url, :url_hash)"), batch)
+            total += len(batch)
+
+        if not total:
+            db.rollback()
+            return
+
+        logger.info(f"Backfilling url_hash for {total} posts")
+
+        # Already keyed rows take part in the merge so they win over legacy duplicates
+        db.execute(text("""
+            INSERT INTO post_url_backfill
+            SELECT p.id, p.url, p.url_hash FROM posts p
+            WHERE p.url_hash IN (SELECT url_hash FROM post_url_backfill)
+        """))
+        db.execute(text("""
+            CREATE TEMP TABLE post_url_survivors ON COMMIT DROP AS
+            SELECT b.id, first_value(b.id) OVER (
+                PARTITION BY b.url_hash
+                ORDER BY (p.url_hash IS NULL), p.published_at DESC NULLS LAST, b.id
+            ) AS keep_id
+            FROM post_url_backfill b JOIN posts p ON p.id = b.id
+        """))
+        # Metrics come together from the duplicate with the most views, the
+        # keeper's own description wins over the others'
+        db.execute(text("""
+            UPDATE posts p SET
+                views = src.views, likes = src.likes, comments = src.comments, score = src.score,
+                used = g.used, description = coalesce(p.description, g.description)
+            FROM (
+                SELECT DISTINCT ON (s.keep_id) s.keep_id, q.views, q.likes, q.comments, q.score
+                FROM post_url_survivors s JOIN posts q ON q.id = s.id
+                ORDER BY s.keep_id, q.views DESC NULLS LAST, q.id
+            ) src, (
+                SELECT s.keep_id, bool_or(q.used) AS used,
+                       (array_agg(q.description ORDER BY q.published_at DESC NULLS LAST, q.id)
+                           FILTER (WHERE q.description IS NOT NULL))[1] AS description
+                FROM post_url_survivors s JOIN posts q ON q.id = s.id
+                GROUP BY s.keep_id
+                HAVING count(*) > 1
+            ) g
+            WHERE p.id = g.keep_id AND src.keep_id = g.keep_id
+        """))
+        merged = db.execute(text(
+            "DELETE FROM posts WHERE id IN (SELECT id FROM post_url_survivors WHERE id <> keep_id)"
+        )).rowcount
+        db.execute(text("""
+            UPDATE posts p SET url = b.url, url_hash = b.url_hash
+            FROM post_url_backfill b
+            WHERE p.id = b.id AND p.url_hash IS NULL
+        """))
+        db.commit()
+
+    logger.info(f"url_hash backfill finished, {merged} duplicate posts merged")
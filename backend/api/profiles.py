@@ -0,0 +1,44 @@
+import os
+import re
+
+from fastapi import APIRouter, Header, HTTPException, Depends
+from fastapi.responses import FileResponse
+from typing import Optional
+
+from utl import profiling
+
+router = APIRouter(prefix="/profiles", tags=["Profiles"])
+
+CAPTURE_ID_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+CAPTURE_KINDS = {
+    "folded": "text/plain",
+    "json": "application/json",
+}
+
+
+def require_profile_token(x_profile_token: Optional[str] = Header(None)):
+    if not profiling.is_authorized(x_profile_token):
+        raise HTTPException(status_code=404, detail="Not found")
+
+
+@router.get("/", dependencies=[Depends(require_profile_token)])
+def list_profiles():
+    return profiling.list_captures()
+
+
+@router.post("/next-job", dependencies=[Depends(require_profile_token)])
+def profile_next_job():
+    profiling.profile_next_job()
+    return {"status": "ok", "armed": True}
+
+
+@router.get("/{capture_id}.{kind}", dependencies=[Depends(require_profile_token)])
+def download_profile(capture_id: str, kind: str):
+    if kind not in CAPTURE_KINDS or not CAPTURE_ID_RE.match(capture_id):
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    path = os.path.join(profiling.PROFILE_DIR, f"{capture_id}.{kind}")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    return FileResponse(path, media_type=CAPTURE_KINDS[kind], filename=os.path.basename(path))
@@ -1,12 +1,12 @@
 import os
 from typing import Generator
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
 import psycopg2
 from psycopg2 import OperationalError
 from time import sleep
 
-from db.models import Base
+from db.models import Base, DESCRIPTION_TSV_EXPR
 from utl.logging import logger
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg2://user:password@db:5432/parserdb")
@@ -22,8 +22,35 @@ DATABASE_CONFIG = dict(
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine)
 
+# create_all() only creates missing tables, so columns and indexes added to
+# existing tables are applied here. Every statement must be idempotent.
+MIGRATIONS = [
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS url_hash BIGINT",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_posts_url_hash ON posts (url_hash)",
+    "ALTER TABLE posts DROP CONSTRAINT IF EXISTS posts_url_key",
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS description_tsv tsvector "
+    f"GENERATED ALWAYS AS ({DESCRIPTION_TSV_EXPR}) STORED",
+    "ALTER TABLE posts ADD COLUMN IF NOT EXISTS scraped_at TIMESTAMP",
+]
+
+# Index builds on large tables: CONCURRENTLY keeps posts writable while they
+# run, which is not allowed inside a transaction block
+CONCURRENT_MIGRATIONS = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_description_tsv ON posts USING gin (description_tsv)",
+]
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    migrate_db()
+
+def migrate_db():
+    with engine.begin() as conn:
+        for statement in MIGRATIONS:
+            conn.execute(text(statement))
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in CONCURRENT_MIGRATIONS:
+            conn.execute(text(statement))
 
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
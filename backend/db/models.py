@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, BigInteger, Float
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, BigInteger, Float, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, declarative_base, deferred
 
 Base = declarative_base()
 
@@ -23,18 +24,28 @@ class Account(Base):
     just_added = Column(Boolean, default=True)
     posts = relationship("Post", back_populates="account")
 
+# 'simple' config: descriptions are multilingual, so no language-specific stemming
+DESCRIPTION_TSV_EXPR = "to_tsvector('simple', coalesce(description, ''))"
+
 class Post(Base):
     __tablename__ = 'posts'
+    __table_args__ = (
+        Index("ix_posts_description_tsv", "description_tsv", postgresql_using="gin"),
+    )
     id = Column(Integer, primary_key=True)
     account_id = Column(Integer, ForeignKey("accounts.id"))
     account = relationship("Account", back_populates="posts")
     network_id = Column(Integer, ForeignKey("networks.id"))
     network = relationship("Network", back_populates="posts")
-    url = Column(String, unique=True)
+    url = Column(String)
+    url_hash = Column(BigInteger, unique=True, index=True)
     published_at = Column(DateTime)
+    scraped_at = Column(DateTime)
     views = Column(BigInteger)
     likes = Column(BigInteger)
     comments = Column(BigInteger)
     score = Column(Float)
     used = Column(Boolean, default=False)
     description = Column(String)
+    # Only used for search filtering, never worth loading with the row
+    description_tsv = deferred(Column(TSVECTOR, Computed(DESCRIPTION_TSV_EXPR, persisted=True)))
@@ -2,15 +2,16 @@ import os
 import asyncio
 
 from datetime import datetime, timedelta
-from fastapi import FastAPI, status
+from fastapi import FastAPI, Request, status
 from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
 
-from db.db import init_db, wait_for_db
-from api import networks, accounts, posts, posts_utl, parser
+from db.db import engine, init_db, wait_for_db
+from api import networks, accounts, posts, posts_utl, parser, profiles
 from api.accounts_utl import sync_accounts_from_google_sheets
 from utl.logging import logger
+from utl import profiling
 
 
 async def nightly_sync_task():
@@ -22,8 +23,9 @@ async def nightly_sync_task():
 
         try:
             logger.info("🌙 Daily tasks started")
-            await asyncio.to_thread(sync_accounts_from_google_sheets)
-            await posts_utl.parse_instagram_posts()
+            with profiling.profile_job("nightly-sync"):
+                await asyncio.to_thread(profiling.call_in_profile, sync_accounts_from_google_sheets)
+                await posts_utl.parse_instagram_posts()
             logger.info("✅ Daily tasks completed")
         except Exception:
             logger.exception("❌ Nightly sync failed")
@@ -35,6 +37,7 @@ async def lifespan(app: FastAPI):
         logger.info("🔄 Initializing database...")
         wait_for_db()
         init_db()
+        posts_utl.backfill_post_url_hashes()
         logger.info("✅ Database initialized")
     except Exception:
         logger.exception("❌ Database initialization failed")
@@ -52,11 +55,27 @@ async def lifespan(app: FastAPI):
 
 
 app = FastAPI(lifespan=lifespan)
+app.router.route_class = profiling.ProfiledRoute
 app.mount("/static", StaticFiles(directory=os.path.join(os.path.dirname(__file__), "static")), name="static")
 app.include_router(networks.router)
 app.include_router(accounts.router)
 app.include_router(posts.router)
 app.include_router(parser.router)
+app.include_router(profiles.router)
+
+profiling.install_sql_hooks(engine)
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    # Listing and downloading captures must not produce captures of its own
+    if (request.url.path.startswith(profiles.router.prefix)
+            or not profiling.is_authorized(request.headers.get(profiling.PROFILE_HEADER))):
+        return await call_next(request)
+
+    with profiling.profile(f"{request.method}-{request.url.path}") as prof:
+        response = await call_next(request)
+    response.headers["X-Profile-Id"] = prof.id
+    return response
 
 @app.get("/")
 async def root():
@@ -60,15 +60,32 @@ class InstagramParser {
     }
   }
 
+  async readAccountsFromStdin() {
+    let input = '';
+    for await (const chunk of process.stdin) {
+      input += chunk;
+    }
+    return input.trim() ? JSON.parse(input) : [];
+  }
+
   async getAccountsForParsing(networkId) {
     try {
+      // Бэкенд передает пакет аккаунтов (вместе с известными постами) через stdin
+      if (process.env.PARSER_BATCH_STDIN === 'true') {
+        const accounts = await this.readAccountsFromStdin();
+        logger.success(`Получено ${accounts.length} аккаунтов для обработки из stdin`);
+        return accounts;
+      }
+
       const backendUrl = process.env.BACKEND_URL || 'http://backend:8000';
 
-      let url = `${backendUrl}/accounts/for-parsing/`;
-      if (networkId) {
-        url += `?network_id=${networkId}`;
+      // Без сети бэкенд не отдает аккаунты: иначе парсер Instagram получил бы ссылки других сетей
+      if (!networkId) {
+        throw new Error('Не задан network_id (аргумент запуска или NETWORK_ID)');
       }
 
+      const url = `${backendUrl}/parser/accounts-for-parsing/?network_id=${networkId}`;
+
       logger.info(`Получаем список аккаунтов для парсинга из: ${url}`);
 
       const { data: accounts } = await axios.get(url);
@@ -105,22 +122,22 @@ class InstagramParser {
         await this.accountParser.saveFollowers(account.id, account.network_id, followers);
       }
 
-      // Парсим посты
-      const posts = await this.postsParser.scrapeAccountPosts(
+      // Парсим посты, пропуская уже устоявшиеся
+      const delta = await this.postsParser.scrapeAccountPosts(
         followers,
         account.id,
         account.network_id,
-        10 // максимум 10 постов
+        10, // максимум 10 постов
+        account.known_posts || []
       );
 
-      if (posts.length > 0) {
-        await this.postsParser.savePosts(posts, account.network_id);
-      }
+      await this.postsParser.savePostDelta(delta, account.id, account.network_id);
 
       // Отмечаем аккаунт как обработанный
       await this.accountParser.markAccountAsParsed(account.id, account.network_id);
 
-      logger.success(`Аккаунт ${account.url} успешно обработан (${posts.length} постов)`);
+      const postsCount = delta.new.length + delta.changed.length + delta.seen.length;
+      logger.success(`Аккаунт ${account.url} успешно обработан (${postsCount} постов, пропущено ${delta.skipped})`);
 
       // Пауза между аккаунтами
       await this.delay(10000);
@@ -128,7 +145,7 @@ class InstagramParser {
       return {
         success: true,
         followers,
-        postsCount: posts.length
+        postsCount
       };
 
     } catch (error) {
@@ -2,6 +2,26 @@
 const logger = require('./comon_logger');
 const axios = require('axios');
 
+const METRIC_FIELDS = ['views', 'likes', 'comments'];
+// Посты старше этого окна отбрасываются
+const POST_WINDOW_MS = 7 * 24 * 60 * 60 * 1000;
+// Закрепленные посты стоят в начале сетки вне зависимости от даты
+const PINNED_POSTS_MAX = 3;
+
+function isOutOfWindow(timestampMs) {
+  return timestampMs < Date.now() - POST_WINDOW_MS;
+}
+
+// /p/, /reel/ и /<username>/reel/ ссылки на один и тот же пост приводим к одному виду,
+// так же как это делает бэкенд (utl/urls.py)
+function canonicalPostUrl(url) {
+  if (!url) {
+    return null;
+  }
+  const match = url.match(/\/(?:p|reel|reels|tv)\/([^/?#]+)/);
+  return match ? `https://www.instagram.com/p/${match[1]}/` : url.split(/[?#]/)[0];
+}
+
 class PostsParser {
   constructor(page) {
     this.page = page;
@@ -116,10 +136,9 @@ class PostsParser {
       const published_at = new Date(timestamp * 1000).toISOString();
 
       // Проверяем, что пост не старше 7 дней
-      const sevenDaysAgo = Date.now() - 7 * 24 * 60 * 60 * 1000;
-      if (timestamp * 1000 < sevenDaysAgo) {
+      if (isOutOfWindow(timestamp * 1000)) {
         logger.info(`Пост ${url} старше 7 дней, пропускаем`);
-        return null;
+        return { url, published_at, outOfWindow: true };
       }
 
       logger.success(`Обработан пост: views=${views}, likes=${likes}, comments=${comments}`);
@@ -139,71 +158,113 @@ class PostsParser {
     }
   }
 
-  async scrapeAccountPosts(followers, accountId, networkId, maxPosts = 10) {
-    const posts = [];
+  async scrapeAccountPosts(followers, accountId, networkId, maxPosts = 10, knownPosts = []) {
+    const delta = { new: [], changed: [], seen: [], skipped: 0 };
+    const known = new Map(
+      knownPosts
+        .filter(post => post && post.url)
+        .map(post => [canonicalPostUrl(post.url), post])
+    );
 
     try {
-      logger.info(`Начинаем парсинг постов для аккаунта ${accountId} (followers: ${followers})`);
+      logger.info(`Начинаем парсинг постов для аккаунта ${accountId} (followers: ${followers}, известно постов: ${known.size})`);
 
       const reelLinks = await this.getReelLinks();
 
       if (reelLinks.length === 0) {
         logger.warn('Не найдено ссылок на посты/reels');
-        return posts;
+        return delta;
       }
 
-      const linksToProcess = reelLinks.slice(0, maxPosts);
+      // /p/ и /reel/ одного поста считаем одной ссылкой
+      const canonicalLinks = [...new Set(reelLinks.map(canonicalPostUrl))];
+      const linksToProcess = canonicalLinks.slice(0, maxPosts);
       logger.info(`Обрабатываем ${linksToProcess.length} постов`);
 
-      for (let url of linksToProcess) {
+      for (let [index, url] of linksToProcess.entries()) {
+        const knownPost = known.get(url);
+        // После закрепленных постов сетка идет от новых к старым: дальше все посты вне окна
+        const pastPinned = index >= PINNED_POSTS_MAX;
+
+        if (knownPost && pastPinned && knownPost.published_at &&
+            isOutOfWindow(Date.parse(knownPost.published_at))) {
+          delta.skipped += linksToProcess.length - index;
+          break;
+        }
+
+        // Метрики устоявшихся постов почти не меняются
+        if (knownPost && knownPost.settled) {
+          delta.skipped++;
+          continue;
+        }
+
         const postData = await this.parsePostData(url);
 
-        if (postData) {
+        if (postData && postData.outOfWindow) {
+          if (pastPinned) {
+            delta.skipped += linksToProcess.length - index - 1;
+            break;
+          }
+        } else if (postData) {
           const engagement_rate = postData.views ? (postData.likes + postData.comments) / postData.views : 0;
           const score = followers > 0 ? (postData.views / followers) * engagement_rate : 0;
 
-          posts.push({
-            ...postData,
-            account_id: accountId,
-            network_id: networkId,
-            score: score,
-          });
+          if (!knownPost) {
+            delta.new.push({
+              ...postData,
+              account_id: accountId,
+              network_id: networkId,
+              score: score,
+            });
+          } else {
+            const changedFields = METRIC_FIELDS.filter(field => postData[field] !== knownPost[field]);
+            if (changedFields.length > 0) {
+              const changed = { url, score };
+              changedFields.forEach(field => { changed[field] = postData[field]; });
+              delta.changed.push(changed);
+            } else {
+              delta.seen.push(url);
+            }
+          }
         }
 
         await this.delay(3000); // Задержка между постами
       }
 
-      logger.success(`Успешно обработано ${posts.length} постов для аккаунта ${accountId}`);
-      return posts;
+      logger.success(`Посты аккаунта ${accountId}: новых ${delta.new.length}, изменилось ${delta.changed.length}, без изменений ${delta.seen.length}, пропущено ${delta.skipped}`);
+      return delta;
 
     } catch (error) {
       logger.error(`Общая ошибка при парсинге постов для аккаунта ${accountId}: ${error.message}`);
-      return posts;
+      return delta;
     }
   }
 
-  async savePosts(posts, networkId) {
+  async savePostDelta(delta, accountId, networkId) {
     try {
-      if (!posts || posts.length === 0) {
-        logger.info('Нет постов для сохранения');
+      if (delta.new.length === 0 && delta.changed.length === 0 && delta.seen.length === 0) {
+        logger.info('Нет изменений постов для сохранения');
         return;
       }
 
       const backendUrl = process.env.BACKEND_URL || 'http://backend:8000';
 
-      logger.info(`Сохраняем ${posts.length} постов в базу данных`);
+      logger.info(`Сохраняем изменения постов: новых ${delta.new.length}, изменилось ${delta.changed.length}`);
 
-      const response = await axios.post(`${backendUrl}/posts/bulk-create/`, {
-        posts: posts,
-        network_id: networkId
+      const response = await axios.post(`${backendUrl}/posts/delta/`, {
+        account_id: accountId,
+        network_id: networkId,
+        new: delta.new,
+        changed: delta.changed,
+        seen: delta.seen
       });
 
-      logger.success(`Успешно сохранено ${posts.length} постов`);
+      logger.success(`Изменения постов сохранены для аккаунта ${accountId}`);
       return response.data;
 
     } catch (error) {
-      logger.error(`Ошибка при сохранении постов: ${error.message}`, {
-        postsCount: posts?.length || 0,
+      logger.error(`Ошибка при сохранении изменений постов: ${error.message}`, {
+        accountId,
         networkId,
         error: error.response?.data || error.message
       });
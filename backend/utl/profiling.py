@@ -0,0 +1,240 @@
+import contextvars
+import functools
+import hmac
+import inspect
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from collections import Counter
+from contextlib import contextmanager, asynccontextmanager
+from datetime import datetime
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+from utl.logging import logger, LOG_DIR
+
+PROFILE_DIR = os.path.join(LOG_DIR, 'profiles')
+
+# Profiling is disabled unless a token is configured
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_HEADER = "X-Profile-Token"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+# Oldest captures are deleted once there are more than this many
+PROFILE_MAX_CAPTURES = int(os.getenv("PROFILE_MAX_CAPTURES", "200"))
+
+# Threads parked in these modules are idle and only add noise to the flamegraph
+IDLE_MODULES = ("threading.py", "selectors.py", "queue.py")
+
+_current = contextvars.ContextVar("profile", default=None)
+
+# One-shot switch: the next background job run is profiled, then it resets
+_profile_next_job = threading.Event()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profile:
+    def __init__(self, name: str):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_")
+        self.id = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{slug}"
+        self.name = name
+        self.samples = Counter()
+        self.sql = []
+        self.subprocesses = []
+        # Only threads that joined this profile are sampled. The event loop
+        # thread is shared by every request and is never sampled, async handlers
+        # are covered by their SQL and subprocess timings instead.
+        self.threads = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name=f"profiler-{slug}", daemon=True)
+
+    def register_thread(self):
+        self.threads.add(threading.get_ident())
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _sample(self):
+        while not self._stop.wait(PROFILE_INTERVAL):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident not in self.threads or frame.f_code.co_filename.endswith(IDLE_MODULES):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+
+        # Collapsed stacks, readable by flamegraph.pl, speedscope and inferno
+        with open(os.path.join(PROFILE_DIR, f"{self.id}.folded"), "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        with open(os.path.join(PROFILE_DIR, f"{self.id}.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "id": self.id,
+                "name": self.name,
+                "duration_ms": round(self.duration * 1000, 3),
+                "sample_interval_ms": PROFILE_INTERVAL * 1000,
+                "samples": sum(self.samples.values()),
+                "sql_ms": round(sum(q["ms"] for q in self.sql), 3),
+                "subprocess_ms": round(sum(p["ms"] for p in self.subprocesses), 3),
+                "sql": self.sql,
+                "subprocesses": self.subprocesses,
+            }, f, ensure_ascii=False, indent=2)
+
+        logger.info(f"Profile {self.id} written ({self.duration:.3f}s, {len(self.sql)} SQL statements)")
+        _prune_captures()
+
+
+def _prune_captures():
+    # Capture ids start with their timestamp, so name order is age order
+    ids = sorted({os.path.splitext(name)[0] for name in os.listdir(PROFILE_DIR)
+                  if name.endswith((".folded", ".json"))})
+    for capture_id in ids[:max(len(ids) - PROFILE_MAX_CAPTURES, 0)]:
+        for ext in (".folded", ".json"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, capture_id + ext))
+            except FileNotFoundError:
+                pass
+
+
+@contextmanager
+def profile(name: str):
+    prof = Profile(name)
+    token = _current.set(prof)
+    prof.start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
+        _current.reset(token)
+        try:
+            prof.write()
+        except OSError:
+            logger.exception(f"Failed to write profile {prof.id}")
+
+
+@asynccontextmanager
+async def track_subprocess(command: str):
+    prof = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if prof is not None:
+            prof.subprocesses.append({
+                "command": command,
+                "ms": round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+def is_authorized(token) -> bool:
+    if not PROFILE_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), PROFILE_TOKEN.encode("utf-8"))
+
+
+def call_in_profile(func, *args, **kwargs):
+    # Runs inside a worker thread (threadpool, asyncio.to_thread): the thread
+    # joins the active profile before any of func's work is done
+    prof = _current.get()
+    if prof is not None:
+        prof.register_thread()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if prof is not None:
+            prof.threads.discard(threading.get_ident())
+
+
+class ProfiledRoute(APIRoute):
+    # FastAPI runs sync endpoints in a threadpool worker. Wrapping them makes
+    # that worker join the request's profile before the handler starts.
+    def __init__(self, path, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            original = endpoint
+
+            @functools.wraps(original)
+            def endpoint(*args, **kw):
+                return call_in_profile(original, *args, **kw)
+
+        super().__init__(path, endpoint, **kwargs)
+
+
+def profile_next_job():
+    _profile_next_job.set()
+
+
+def next_job_profiled() -> bool:
+    return bool(PROFILE_TOKEN) and _profile_next_job.is_set()
+
+
+@contextmanager
+def profile_job(name: str):
+    if not next_job_profiled():
+        yield None
+        return
+    _profile_next_job.clear()
+    with profile(name) as prof:
+        yield prof
+
+
+def install_sql_hooks(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        prof = _current.get()
+        if prof is not None and conn.info.get("profile_started"):
+            started = conn.info["profile_started"].pop()
+            prof.sql.append({
+                "statement": statement,
+                "ms": round((time.perf_counter() - started) * 1000, 3),
+                "executemany": executemany,
+            })
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        if _current.get() is not None and context.connection is not None:
+            started = context.connection.info.get("profile_started")
+            if started:
+                started.pop()
+
+
+def list_captures():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    captures = []
+    for filename in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, filename), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        captures.append({key: meta.get(key) for key in ("id", "name", "duration_ms", "samples", "sql_ms", "subprocess_ms")})
+    return captures
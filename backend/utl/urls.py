@@ -0,0 +1,74 @@
+import hashlib
+
+from urllib.parse import urlparse, parse_qs
+
+
+def _strip_www(host: str) -> str:
+    return host[4:] if host.startswith("www.") else host
+
+
+def _canonical_instagram(path: str, query: dict):
+    # /p/<code>/, /reel/<code>/, /reels/<code>/, /tv/<code>/ and the
+    # /<username>/p/<code>/ variants all point to the same media shortcode
+    parts = [p for p in path.split("/") if p]
+    for i, part in enumerate(parts[:-1]):
+        if part in ("p", "reel", "reels", "tv"):
+            return f"https://www.instagram.com/p/{parts[i + 1]}/"
+    return None
+
+
+def _canonical_tiktok(path: str, query: dict):
+    parts = [p for p in path.split("/") if p]
+    if len(parts) >= 3 and parts[0].startswith("@") and parts[1] in ("video", "photo"):
+        return f"https://www.tiktok.com/{parts[0].lower()}/{parts[1]}/{parts[2]}"
+    return None
+
+
+def _canonical_youtube(path: str, query: dict):
+    parts = [p for p in path.split("/") if p]
+    video_id = None
+    if parts[:1] == ["watch"] and query.get("v"):
+        video_id = query["v"][0]
+    elif len(parts) >= 2 and parts[0] in ("shorts", "live", "embed"):
+        video_id = parts[1]
+    if video_id:
+        return f"https://www.youtube.com/watch?v={video_id}"
+    return None
+
+
+def _canonical_youtu_be(path: str, query: dict):
+    parts = [p for p in path.split("/") if p]
+    if parts:
+        return f"https://www.youtube.com/watch?v={parts[0]}"
+    return None
+
+
+CANONICALIZERS = {
+    "instagram.com": _canonical_instagram,
+    "tiktok.com": _canonical_tiktok,
+    "youtube.com": _canonical_youtube,
+    "m.youtube.com": _canonical_youtube,
+    "youtu.be": _canonical_youtu_be,
+}
+
+
+def canonicalize_post_url(url: str) -> str:
+    url = url.strip()
+    parsed = urlparse(url if "://" in url else "https://" + url)
+    host = _strip_www(parsed.netloc.lower().split(":")[0])
+
+    canonicalizer = CANONICALIZERS.get(host)
+    if canonicalizer:
+        canonical = canonicalizer(parsed.path, parse_qs(parsed.query))
+        if canonical:
+            return canonical
+
+    # Unknown network: drop query string, fragment and trailing slash
+    path = parsed.path.rstrip("/")
+    return f"https://{host}{path}"
+
+
+def post_url_hash(canonical_url: str) -> int:
+    # Signed 64-bit so it fits a Postgres BIGINT
+    digest = hashlib.blake2b(canonical_url.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)